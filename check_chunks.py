@@ -1,15 +1,24 @@
+from qdrant_client.models import Filter, FieldCondition, MatchText
+
 from server.qdrant_client import client, COLLECTION
 
 target = "Success Case Study Planning Guide"
 count = 0
 
-recs, nextp = client.scroll(collection_name=COLLECTION, limit=1000)
-while recs:
-    for r in recs:
-        if target in (r.payload or {}).get("source", ""):
-            count += 1
+# Filter server-side and skip vectors/payloads; we only need the count
+source_filter = Filter(must=[FieldCondition(key="source", match=MatchText(text=target))])
+nextp = None
+while True:
+    recs, nextp = client.scroll(
+        collection_name=COLLECTION,
+        scroll_filter=source_filter,
+        limit=1000,
+        offset=nextp,
+        with_payload=False,
+        with_vectors=False,
+    )
+    count += len(recs)
     if not nextp:
         break
-    recs, nextp = client.scroll(collection_name=COLLECTION, limit=1000, offset=nextp)
 
 print(f"Chunks from '{target}':", count)
@@ -1,12 +1,13 @@
 # sanity_qdrant.py
 from server.qdrant_client import client, COLLECTION
 from qdrant_client.http.models import ScrollRequest
+from qdrant_client.models import Filter, FieldCondition, MatchText
 
 print("Collection:", COLLECTION)
 
 try:
     # Grab a few records to prove data exists
-    recs, _ = client.scroll(collection_name=COLLECTION, limit=5)
+    recs, _ = client.scroll(collection_name=COLLECTION, limit=5, with_vectors=False)
     print("Sample records returned:", len(recs))
 except Exception as e:
     print("Scroll error:", e)
@@ -15,18 +16,19 @@ except Exception as e:
 target = "Success Case Study Planning Guide"
 count = 0
 try:
-    # Scroll through up to 5000 points in batches of 1000
+    # Scroll matching points in batches of 1000; filter runs inside Qdrant
+    source_filter = Filter(must=[FieldCondition(key="source", match=MatchText(text=target))])
     next_page = None
     while True:
         recs, next_page = client.scroll(
             collection_name=COLLECTION,
+            scroll_filter=source_filter,
             limit=1000,
-            offset=next_page
+            offset=next_page,
+            with_payload=False,
+            with_vectors=False,
         )
-        for r in recs:
-            src = (r.payload or {}).get("source", "")
-            if target in src:
-                count += 1
+        count += len(recs)
         if not next_page:
             break
     print(f"Chunks from '{target}':", count)
@@ -1,5 +1,6 @@
 # server/app.py
 import os, asyncio
+from contextlib import asynccontextmanager
 from pathlib import Path
 from dotenv import load_dotenv
 from fastapi import FastAPI
@@ -13,12 +14,35 @@ if os.name == "nt":
         asyncio.set_event_loop_policy(asyncio.WindowsProactorEventLoopPolicy())
     except Exception as e:
         print("[eventloop] Could not set Proactor policy:", e)
+else:
+    # uvloop is considerably faster than the stdlib loop for socket-heavy work
+    try:
+        import uvloop
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    except ImportError:
+        pass
 
 # Load env
 load_dotenv()
 
+# --- Warm heavy singletons before the first request; release them on shutdown ---
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    from . import image_gen, pdf
+    await pdf.start()  # one Chromium for all PDF renders
+    try:
+        from .qdrant_client import client, COLLECTION
+        client.get_collection(COLLECTION)  # opens storage + pages in the collection
+    except Exception as e:
+        print("[startup] qdrant warm-up skipped:", type(e).__name__, e)
+    try:
+        yield
+    finally:
+        await pdf.stop()
+        await image_gen.aclose()
+
 # --- FastAPI app ---
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 # --- CORS (open for local dev; tighten later) ---
 app.add_middleware(
@@ -47,5 +71,16 @@ app.include_router(server_router)
 
 # --- Add this section for Cloud Run compatibility ---
 if __name__ == "__main__":
+    import uvicorn
     port = int(os.environ.get("PORT", 8080))  # Default to 8080 if PORT not set
-    uvicorn.run(app, host="0.0.0.0", port=port)  # Must bind to 0.0.0.0
\ No newline at end of file
+    # Embedded Qdrant (qdrant_data/) allows one process per storage dir, so default
+    # to a single worker; raise WEB_CONCURRENCY only when pointing at a Qdrant server
+    workers = int(os.getenv("WEB_CONCURRENCY", 1))
+    uvicorn.run(
+        "server.app:app",  # import string required when workers > 1
+        host="0.0.0.0",  # Must bind to 0.0.0.0
+        port=port,
+        loop="asyncio" if os.name == "nt" else "uvloop",
+        http="httptools",
+        workers=workers,
+    )
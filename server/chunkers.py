@@ -1,13 +1,22 @@
 import re
 
+_PARA_SPLIT = re.compile(r"\n\s*\n")
+
 def split_paragraphs(text, max_chars=1200, overlap=150):
-    parts, current = [], ""
-    for para in re.split(r"\n\s*\n", text):
-        if len(current) + len(para) + 1 <= max_chars:
-            current = (current + "\n" + para).strip()
+    # Accumulate pieces in a list and join once per chunk (linear, not quadratic)
+    parts, current_parts, current_len = [], [], 0
+    for para in _PARA_SPLIT.split(text):
+        if current_len + len(para) + 1 <= max_chars:
+            piece = para.rstrip() if current_parts else para.strip()
+            if piece:
+                current_len += len(piece) + (1 if current_parts else 0)
+                current_parts.append(piece)
         else:
+            current = "\n".join(current_parts)
             if current: parts.append(current)
             tail = current[-overlap:] if current else ""
             current = (tail + "\n" + para).strip()
-    if current: parts.append(current)
+            current_parts = [current] if current else []
+            current_len = len(current)
+    if current_parts: parts.append("\n".join(current_parts))
     return [p.strip() for p in parts if p.strip()]
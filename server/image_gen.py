@@ -1,22 +1,72 @@
 # server/image_gen.py
-import os, base64, hashlib
+import os, base64, hashlib, asyncio, random, threading
 from pathlib import Path
 from typing import Dict, List
 
+import httpx
+import requests
+
 # ---------- Config ----------
 IMAGE_PROVIDER = (os.getenv("IMAGE_PROVIDER") or "openai").strip().lower()  # "openai" or "stability"
 IMAGE_STYLE = os.getenv("IMAGE_STYLE", "instructional diagram, flat UI, neutral background, clear labels, no clutter")
 IMAGE_SIZE = os.getenv("IMAGE_SIZE", "1024x1024")  # OpenAI uses WxH
 LOG_IMAGE_PROMPTS = (os.getenv("LOG_IMAGE_PROMPTS") or "").lower() in ("1", "true", "yes")
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", "8"))  # concurrent provider requests per call
 
 # Absolute output dir inside the container
 BASE_DIR = Path(__file__).resolve().parents[1]
 OUT_DIR = BASE_DIR / "static" / "images"
 OUT_DIR.mkdir(parents=True, exist_ok=True)
 
+# Shared async HTTP client: keeps TLS connections to the image API alive across calls
+OPENAI_BASE_URL = (os.getenv("OPENAI_BASE_URL") or "https://api.openai.com/v1").rstrip("/")
+OPENAI_IMAGES_URL = f"{OPENAI_BASE_URL}/images/generations"
+IMAGE_MAX_RETRIES = int(os.getenv("IMAGE_MAX_RETRIES", "2"))  # on 429/5xx/network errors, like the SDK
+_RETRY_STATUS = {408, 409, 429, 500, 502, 503, 504}
+_HTTPX: httpx.AsyncClient | None = None
+STABILITY_URL = "https://api.stability.ai/v2beta/stable-image/generate/core"
+# requests.Session isn't documented as thread-safe and calls run in to_thread
+# workers, so each worker thread keeps its own keep-alive session
+_STABILITY = threading.local()
+
+# Cache keys known to have a .png on disk (seeded lazily from OUT_DIR)
+_KNOWN_KEYS: set[str] = set()
+_KNOWN_SEEDED = False
+
 # ---------- Helpers ----------
+def _http() -> httpx.AsyncClient:
+    global _HTTPX
+    if _HTTPX is None:
+        _HTTPX = httpx.AsyncClient(
+            http2=True,
+            timeout=120,
+            limits=httpx.Limits(max_connections=16, max_keepalive_connections=16),
+        )
+    return _HTTPX
+
+async def aclose() -> None:
+    # Called on app shutdown; the next request (e.g. a new lifespan) gets a fresh client
+    global _HTTPX
+    if _HTTPX is not None:
+        client, _HTTPX = _HTTPX, None
+        await client.aclose()
+
+def _is_cached(key: str, fpath: Path) -> bool:
+    global _KNOWN_SEEDED
+    if not _KNOWN_SEEDED:
+        _KNOWN_KEYS.update(p.stem for p in OUT_DIR.iterdir() if p.suffix == ".png")
+        _KNOWN_SEEDED = True
+    if key in _KNOWN_KEYS:
+        return True
+    # Fall back to disk on a miss (file may have been written by another worker)
+    if fpath.exists():
+        _KNOWN_KEYS.add(key)
+        return True
+    return False
+
 def _slug(s: str) -> str:
-    return hashlib.sha256(s.encode("utf-8")).hexdigest()[:16]
+    # Non-cryptographic cache key: blake2b with an 8-byte digest (16 hex chars)
+    return hashlib.blake2b(s.encode("utf-8"), digest_size=8).hexdigest()
 
 def _prompt_from_step(title: str, action: str, style: str) -> str:
     title = (title or "").strip()
@@ -31,40 +81,93 @@ def _prompt_from_step(title: str, action: str, style: str) -> str:
     )
 
 # ---------- Providers ----------
-def _generate_image_openai(prompt: str, size: str = "1024x1024") -> bytes:
-    from openai import OpenAI
+def _stability_session() -> requests.Session:
+    session = getattr(_STABILITY, "session", None)
+    if session is None:
+        session = _STABILITY.session = requests.Session()
+    return session
+
+def _retry_delay(attempt: int, retry_after: str | None) -> float:
+    # Honor a numeric Retry-After (capped), else exponential backoff with jitter
+    try:
+        if retry_after is not None:
+            return min(float(retry_after), 60.0)
+    except ValueError:
+        pass
+    return min(0.5 * 2 ** attempt, 8.0) * (0.75 + random.random() / 2)
+
+async def _generate_image_openai(prompt: str, size: str = "1024x1024") -> bytes:
+    api_key = os.getenv("OPENAI_API_KEY", "").strip()
+    if not api_key:
+        raise RuntimeError("OPENAI_API_KEY not set")
     if LOG_IMAGE_PROMPTS:
         print("[image_gen] openai ->", prompt[:180], "…")
-    client = OpenAI()
-    resp = client.images.generate(model="gpt-image-1", prompt=prompt, size=size)
-    return base64.b64decode(resp.data[0].b64_json)
+    for attempt in range(IMAGE_MAX_RETRIES + 1):
+        last = attempt == IMAGE_MAX_RETRIES
+        try:
+            r = await _http().post(
+                OPENAI_IMAGES_URL,
+                json={"model": "gpt-image-1", "prompt": prompt, "size": size},
+                headers={"Authorization": f"Bearer {api_key}"},
+            )
+        except httpx.TransportError:
+            if last:
+                raise
+            await asyncio.sleep(_retry_delay(attempt, None))
+            continue
+        if r.status_code not in _RETRY_STATUS or last:
+            break
+        await asyncio.sleep(_retry_delay(attempt, r.headers.get("retry-after")))
+    if r.status_code != 200:
+        raise RuntimeError(f"OpenAI images error: {r.status_code} {r.text[:300]}")
+    return base64.b64decode(r.json()["data"][0]["b64_json"])
 
 def _generate_image_stability(prompt: str, aspect_ratio: str = "1:1") -> bytes:
-    import requests
     api_key = os.getenv("STABILITY_API_KEY")
     if not api_key:
         raise RuntimeError("Missing STABILITY_API_KEY")
     if LOG_IMAGE_PROMPTS:
         print("[image_gen] stability ->", prompt[:180], "…")
-    url = "https://api.stability.ai/v2beta/stable-image/generate/core"
     headers = {"Authorization": f"Bearer {api_key}", "Accept": "image/png"}
     files = {"none": ("", "")}  # multipart needs a files part
     data = {"prompt": prompt, "mode": "text-to-image", "output_format": "png", "aspect_ratio": aspect_ratio}
-    r = requests.post(url, headers=headers, files=files, data=data, timeout=120)
+    r = _stability_session().post(STABILITY_URL, headers=headers, files=files, data=data, timeout=120)
     if r.status_code != 200:
         raise RuntimeError(f"Stability API error: {r.status_code} {r.text[:300]}")
     return r.content
 
-def _generate_image(prompt: str, size: str = "1024x1024") -> bytes:
+async def _generate_image(prompt: str, size: str = "1024x1024") -> bytes:
     if IMAGE_PROVIDER == "stability":
-        return _generate_image_stability(prompt, aspect_ratio="1:1")
-    return _generate_image_openai(prompt, size=size)
+        # requests is blocking; keep it off the event loop
+        return await asyncio.to_thread(_generate_image_stability, prompt, aspect_ratio="1:1")
+    return await _generate_image_openai(prompt, size=size)
 
 # ---------- Public ----------
-def attach_step_images(data: Dict) -> Dict:
+def _write_image(fpath: Path, img_bytes: bytes) -> None:
+    # Write a per-process temp name, then rename into place so /static never serves
+    # a partial image. O_TRUNC (not O_EXCL): a crash leaves at most one stale temp
+    # per key and pid, which the next attempt simply reuses
+    tmp = fpath.with_name(f"{fpath.stem}.{os.getpid()}.tmp")
+    fd = os.open(str(tmp), os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        try:
+            view = memoryview(img_bytes)
+            while view:  # os.write may be short
+                view = view[os.write(fd, view):]
+        finally:
+            os.close(fd)
+        os.replace(tmp, fpath)
+    except BaseException:
+        tmp.unlink(missing_ok=True)  # don't leave a truncated image behind
+        raise
+
+async def attach_step_images(data: Dict) -> Dict:
     steps: List[Dict] = list(data.get("steps") or [])
     out_steps: List[Dict] = []
+    # key -> (prompt, fpath, steps); identical steps share one generation
+    pending: Dict[str, tuple] = {}
 
+    # Pass 1: resolve cache hits, collect unique misses
     for s in steps:
         title = (s.get("title") or "").strip()
         action = (s.get("action") or "").strip()
@@ -75,19 +178,29 @@ def attach_step_images(data: Dict) -> Dict:
         fname = f"{key}.png"
         fpath = OUT_DIR / fname
 
-        if not fpath.exists():
-            prompt = _prompt_from_step(title, action, IMAGE_STYLE)
-            try:
-                img_bytes = _generate_image(prompt, size=IMAGE_SIZE)
-                tmp = fpath.with_suffix(".png.tmp")
-                with open(tmp, "wb") as f:
-                    f.write(img_bytes)
-                tmp.replace(fpath)
-            except Exception as e:
-                s["image_error"] = f"{type(e).__name__}: {e}"
+        if key in pending:
+            pending[key][2].append(s)
+        elif not _is_cached(key, fpath):
+            pending[key] = (_prompt_from_step(title, action, IMAGE_STYLE), fpath, [s])
 
         s["image_url"] = f"/static/images/{fname}"
         out_steps.append(s)
 
+    # Pass 2: generate misses concurrently on the running event loop
+    if pending:
+        sem = asyncio.Semaphore(IMAGE_WORKERS)
+
+        async def _gen(key: str, prompt: str, fpath: Path, owners: List[Dict]) -> None:
+            try:
+                async with sem:
+                    img_bytes = await _generate_image(prompt, size=IMAGE_SIZE)
+                _write_image(fpath, img_bytes)
+                _KNOWN_KEYS.add(key)
+            except Exception as e:
+                for s in owners:
+                    s["image_error"] = f"{type(e).__name__}: {e}"
+
+        await asyncio.gather(*[_gen(key, *job) for key, job in pending.items()])
+
     data["steps"] = out_steps
     return data
@@ -1,16 +1,36 @@
 # server/ingest.py
-import os, glob, uuid, math
+import os, io, glob, uuid, math, hashlib, queue, threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from typing import List
 from dotenv import load_dotenv
 
+import torch
 from qdrant_client.models import PointStruct
 from sentence_transformers import SentenceTransformer
 
-from .qdrant_client import client, ensure_collection, COLLECTION
+from .qdrant_client import client, ensure_collection, ensure_source_index, COLLECTION
 
 load_dotenv()
 
 EMBED_MODEL_NAME = os.getenv("EMBED_MODEL_NAME", "all-MiniLM-L6-v2")
+# Opt-in ONNX backend for CPU runs: pip install "sentence-transformers[onnx]" and set
+# EMBED_BACKEND=onnx. For an int8 export matching the CPU set EMBED_ONNX_FILE, e.g.
+# onnx/model_quint8_avx2.onnx or onnx/model_qint8_avx512_vnni.onnx
+EMBED_BACKEND = (os.getenv("EMBED_BACKEND") or "torch").strip().lower()  # "torch" or "onnx"
+EMBED_ONNX_FILE = os.getenv("EMBED_ONNX_FILE", "onnx/model.onnx")
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "128"))
+CHUNK_TOKENS = int(os.getenv("CHUNK_TOKENS", "200"))
+CHUNK_STRIDE = int(os.getenv("CHUNK_STRIDE", "150"))
+UPSERT_BATCH_SIZE = int(os.getenv("UPSERT_BATCH_SIZE", "256"))
+LOAD_WORKERS = int(os.getenv("LOAD_WORKERS", "4"))
+
+# Namespace for deterministic point ids: re-ingesting unchanged chunks overwrites in place
+POINT_ID_NAMESPACE = uuid.UUID("00000000-0000-0000-0000-000000000001")
+
+def point_id(source: str, chunk: str) -> str:
+    chunk_hash = hashlib.blake2b(chunk.encode("utf-8"), digest_size=16).hexdigest()
+    return str(uuid.uuid5(POINT_ID_NAMESPACE, f"{source}|{chunk_hash}"))
 
 # --------- util: load docs ----------
 def read_txt(path: str) -> str:
@@ -23,7 +43,10 @@ def read_docx(path: str) -> str:
     except ImportError:
         raise RuntimeError("Install python-docx: pip install python-docx")
     doc = docx.Document(path)
-    return "\n".join(p.text for p in doc.paragraphs)
+    # Stream paragraphs into one buffer instead of a list + joined copy
+    buf = io.StringIO()
+    buf.writelines(p.text + "\n" for p in doc.paragraphs)
+    return buf.getvalue()
 
 def load_document(path: str) -> str:
     ext = os.path.splitext(path)[1].lower()
@@ -34,24 +57,59 @@ def load_document(path: str) -> str:
     # You can add .pdf later; for now, skip with a clear message
     raise RuntimeError(f"Unsupported file type for now: {ext} ({path})")
 
-# --------- util: simple chunker ----------
-def chunk_text(text: str, max_chars: int = 1000) -> List[str]:
-    # split on blank lines; then re-pack to ~1000 chars
-    paras = [p.strip() for p in text.splitlines()]
-    blocks, buf = [], []
-    size = 0
-    for line in paras:
-        if not line:
-            line = "\n"
-        if size + len(line) + 1 > max_chars and buf:
-            blocks.append(" ".join(buf).strip())
-            buf, size = [], 0
-        buf.append(line)
-        size += len(line) + 1
-    if buf:
-        blocks.append(" ".join(buf).strip())
-    # drop empties
-    return [b for b in blocks if b and not b.isspace()]
+# --------- util: sliding-window chunker ----------
+def chunk_text(text: str, tokenizer, window: int = CHUNK_TOKENS, stride: int = CHUNK_STRIDE) -> List[str]:
+    # Fixed-size token windows with overlap (window - stride); yields
+    # ceil((N - window) / stride) + 1 chunks of uniform length. Windows are cut
+    # from the original text by character offsets so casing/accents survive
+    # (decoding ids would store the tokenizer's normalized form with [UNK]s)
+    offsets = tokenizer(text, return_offsets_mapping=True, add_special_tokens=False)["offset_mapping"]
+    if not offsets:
+        return []
+    chunks = []
+    for i in range(0, max(len(offsets) - window, 0) + stride, stride):
+        span = offsets[i:i + window]
+        chunk = text[span[0][0]:span[-1][1]].strip()
+        if chunk:
+            chunks.append(chunk)
+    return chunks
+
+# --------- pipeline stages ----------
+# load (thread pool, disk-bound) -> embed (main thread, CPU/GPU) -> upsert (one writer thread)
+_DONE = object()
+
+def _load_or_skip(path: str):
+    try:
+        return path, load_document(path)
+    except Exception as e:
+        print(f"SKIP {path}: {type(e).__name__}: {e}")
+        return path, None
+
+def _produce_documents(files: List[str], out_q: queue.Queue):
+    try:
+        # At most LOAD_WORKERS loads in flight (executor.map would submit every
+        # file up front and hold all documents in memory); results stay in order
+        with ThreadPoolExecutor(max_workers=LOAD_WORKERS) as loaders:
+            pending: deque = deque()
+            for path in files:
+                if len(pending) >= LOAD_WORKERS:
+                    out_q.put(pending.popleft().result())
+                pending.append(loaders.submit(_load_or_skip, path))
+            while pending:
+                out_q.put(pending.popleft().result())
+    finally:
+        out_q.put(_DONE)
+
+def _upsert_worker(in_q: queue.Queue, errors: list):
+    # Single writer: embedded Qdrant's local collection is not safe for concurrent upserts
+    while True:
+        batch = in_q.get()
+        if batch is _DONE:
+            return
+        try:
+            client.upsert(collection_name=COLLECTION, points=batch)
+        except Exception as e:
+            errors.append(e)
 
 def main():
     docs_dir = os.path.join(os.getcwd(), "docs")
@@ -63,40 +121,78 @@ def main():
         raise RuntimeError(f"No .txt or .docx files in {docs_dir}")
 
     print(f"Loading embed model: {EMBED_MODEL_NAME}")
-    model = SentenceTransformer(EMBED_MODEL_NAME)
+    device = "cuda" if torch.cuda.is_available() else "cpu"
+    model = None
+    if device == "cpu" and EMBED_BACKEND == "onnx":
+        try:
+            model = SentenceTransformer(
+                EMBED_MODEL_NAME,
+                device=device,
+                backend="onnx",
+                model_kwargs={"file_name": EMBED_ONNX_FILE},
+            )
+        except Exception as e:  # extra not installed, or export missing for this model
+            print(f"ONNX backend unavailable ({type(e).__name__}: {e}); falling back to torch")
+    if model is None:
+        model = SentenceTransformer(EMBED_MODEL_NAME, device=device)
+        if device == "cuda":
+            model.half()  # fp16 halves memory traffic on GPU
     dim = model.get_sentence_embedding_dimension()
-    print(f"Embed dim: {dim}")
+    print(f"Embed dim: {dim} (device: {device}, backend: {getattr(model, 'backend', 'torch')})")
 
     # Ensure collection matches this dimension
     ensure_collection(vector_size=dim)
+    ensure_source_index()
+
+    # Small bounded queues between stages so each one blocks instead of buffering everything
+    load_q: queue.Queue = queue.Queue(maxsize=2)
+    upsert_q: queue.Queue = queue.Queue(maxsize=2)
+    upsert_errors: list = []
+
+    producer = threading.Thread(target=_produce_documents, args=(files, load_q), daemon=True)
+    uploader = threading.Thread(target=_upsert_worker, args=(upsert_q, upsert_errors), daemon=True)
+    producer.start()
+    uploader.start()
 
     total_points = 0
-    for path in files:
-        try:
-            full = load_document(path)
-        except Exception as e:
-            print(f"SKIP {path}: {type(e).__name__}: {e}")
+    while (item := load_q.get()) is not _DONE:
+        path, full = item
+        if full is None:
             continue
 
-        chunks = chunk_text(full, max_chars=1000)
+        chunks = chunk_text(full, model.tokenizer)
         if not chunks:
             print(f"SKIP (no text) {path}")
             continue
 
-        vecs = model.encode(chunks, normalize_embeddings=True).tolist()
+        vecs = model.encode(
+            chunks,
+            batch_size=EMBED_BATCH_SIZE,
+            normalize_embeddings=True,
+            convert_to_numpy=True,
+            show_progress_bar=False,
+        )
+        source = os.path.basename(path)
         points = []
         for chunk, vec in zip(chunks, vecs):
             points.append(
                 PointStruct(
-                    id=str(uuid.uuid4()),
-                    vector=vec,
-                    payload={"source": os.path.basename(path), "chunk": chunk},
+                    id=point_id(source, chunk),
+                    vector=vec.tolist(),
+                    payload={"source": source, "chunk": chunk},
                 )
             )
 
-        client.upsert(collection_name=COLLECTION, points=points)
+        # Upsert in small batches so embedding the next file overlaps the write
+        for i in range(0, len(points), UPSERT_BATCH_SIZE):
+            upsert_q.put(points[i:i + UPSERT_BATCH_SIZE])
         total_points += len(points)
-        print(f"{os.path.basename(path)} → {len(points)} chunks")
+        print(f"{source} → {len(points)} chunks")
+
+    upsert_q.put(_DONE)
+    uploader.join()
+    if upsert_errors:
+        raise RuntimeError(f"{len(upsert_errors)} upsert batch(es) failed") from upsert_errors[0]
 
     print(f"Done. Upserted {total_points} vectors into collection '{COLLECTION}'.")
 
@@ -0,0 +1,76 @@
+# server/pdf.py
+import os, asyncio
+import mimetypes
+from pathlib import Path
+from urllib.parse import urlsplit, unquote
+
+# ---------- Config ----------
+PDF_MAX_PAGES = int(os.getenv("PDF_MAX_PAGES", "4"))  # concurrent renders sharing the browser
+PDF_TIMEOUT_MS = int(os.getenv("PDF_TIMEOUT_MS", "15000"))  # per render (load + print)
+
+STATIC_DIR = (Path(__file__).resolve().parents[1] / "static").resolve()
+
+# One Chromium per process, launched at startup; each render gets a throwaway context
+_PW = None
+_BROWSER = None
+_SLOTS = asyncio.Semaphore(PDF_MAX_PAGES)
+
+class PdfUnavailable(RuntimeError):
+    pass
+
+async def start() -> None:
+    global _PW, _BROWSER
+    try:
+        from playwright.async_api import async_playwright
+    except ImportError:
+        print("[pdf] playwright not installed; /html-to-pdf disabled")
+        return
+    try:
+        _PW = await async_playwright().start()
+        _BROWSER = await _PW.chromium.launch()
+    except Exception as e:
+        print("[pdf] could not launch chromium:", type(e).__name__, e)
+        await stop()
+
+async def stop() -> None:
+    global _PW, _BROWSER
+    if _BROWSER is not None:
+        await _BROWSER.close()
+        _BROWSER = None
+    if _PW is not None:
+        await _PW.stop()
+        _PW = None
+
+async def _route(route) -> None:
+    # The HTML is caller-supplied: never let Chromium reach the network (SSRF).
+    # Inline data is allowed and /static/... is served straight from disk.
+    parts = urlsplit(route.request.url)
+    if parts.scheme in ("data", "blob", "about"):
+        await route.continue_()
+        return
+    if parts.path.startswith("/static/"):
+        path = (STATIC_DIR / unquote(parts.path[len("/static/"):])).resolve()
+        if path.is_relative_to(STATIC_DIR) and path.is_file():
+            ctype = mimetypes.guess_type(path.name)[0] or "application/octet-stream"
+            await route.fulfill(body=path.read_bytes(), content_type=ctype)
+            return
+    await route.abort()
+
+async def _print(page, html: str) -> bytes:
+    await page.set_content(html, wait_until="networkidle")
+    return await page.pdf(format="Letter", print_background=True)
+
+async def render_pdf(html: str) -> bytes:
+    if _BROWSER is None:
+        raise PdfUnavailable("PDF rendering unavailable (Playwright/Chromium not running)")
+    async with _SLOTS:
+        # Contexts are cheap (~ms) and isolate cookies/storage; the browser stays up
+        context = await _BROWSER.new_context()
+        try:
+            await context.route("**/*", _route)
+            page = await context.new_page()
+            return await asyncio.wait_for(_print(page, html), PDF_TIMEOUT_MS / 1000)
+        except asyncio.TimeoutError:
+            raise PdfUnavailable(f"PDF render timed out after {PDF_TIMEOUT_MS} ms") from None
+        finally:
+            await context.close()
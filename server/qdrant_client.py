@@ -1,7 +1,7 @@
 # server/qdrant_client.py
 import os
 from qdrant_client import QdrantClient
-from qdrant_client.models import Distance, VectorParams
+from qdrant_client.models import Distance, VectorParams, PayloadSchemaType
 
 COLLECTION = os.getenv("COLLECTION_NAME", "docs")
 
@@ -22,3 +22,18 @@ def ensure_collection(vector_size: int):
         collection_name=COLLECTION,
         vectors_config=VectorParams(size=vector_size, distance=Distance.COSINE),
     )
+
+def ensure_source_index():
+    """
+    Full-text payload index on "source" so MatchText filters don't full-scan.
+    Only a Qdrant server uses it; embedded mode ignores payload indexes (and
+    warns), so this is a no-op for the local client.
+    """
+    opts = client.init_options
+    if opts.get("path") or opts.get("location") == ":memory:":
+        return
+    client.create_payload_index(
+        collection_name=COLLECTION,
+        field_name="source",
+        field_schema=PayloadSchemaType.TEXT,
+    )
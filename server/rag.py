@@ -1,62 +1,222 @@
 # server/rag.py
 import os
 import re
-import json
-from typing import List, Dict, Any
+import asyncio
+import hashlib
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import List, Dict, Any, AsyncIterator, Tuple
+import numpy as np
+import httpx
+import orjson
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient
 from dotenv import load_dotenv
 
 load_dotenv()
 
+# One client per process: keeps the HTTP pool (and TLS sessions) alive across calls.
+# Created on first use so the app still imports when OPENAI_API_KEY is unset.
+_OPENAI: AsyncOpenAI | None = None
+
+def _openai_client() -> AsyncOpenAI:
+    global _OPENAI
+    if _OPENAI is None:
+        _OPENAI = AsyncOpenAI(
+            # SDK defaults (timeouts etc.) over HTTP/2, so concurrent embed + LLM
+            # calls multiplex on one TLS connection instead of one handshake each
+            http_client=DefaultAsyncHttpxClient(
+                http2=True,
+                transport=httpx.AsyncHTTPTransport(
+                    http2=True,
+                    retries=2,  # connection-level retries only
+                    limits=httpx.Limits(max_connections=100, max_keepalive_connections=50),
+                ),
+            ),
+        )
+    return _OPENAI
+
 # -------------------------
 # Embeddings (OpenAI, lightweight)
 # -------------------------
 OPENAI_EMBED_MODEL = os.getenv("OPENAI_EMBED_MODEL", "text-embedding-3-small")
 
-def _embed_single(text: str) -> list[float]:
-    from openai import OpenAI
-    client = OpenAI()
-    resp = client.embeddings.create(model=OPENAI_EMBED_MODEL, input=[text])
-    return resp.data[0].embedding
+async def _embed_batch(texts: list[str]) -> list[list[float]]:
+    # One request for many inputs (query variants, rewrites) instead of one RTT each
+    resp = await _openai_client().embeddings.create(model=OPENAI_EMBED_MODEL, input=texts)
+    return [d.embedding for d in resp.data]
+
+async def _embed_single(text: str) -> list[float]:
+    return (await _embed_batch([text]))[0]
+
+# Query-embedding cache: repeat questions skip the OpenAI round-trip
+_EMB_CACHE: dict[str, list[float]] = {}
+_EMB_CACHE_MAX = 4096
+
+async def _embed_query(question: str) -> list[float]:
+    key = question.strip().lower()
+    vec = _EMB_CACHE.get(key)
+    if vec is None:
+        vec = await _embed_single(question)
+        if len(_EMB_CACHE) >= _EMB_CACHE_MAX:
+            del _EMB_CACHE[next(iter(_EMB_CACHE))]  # FIFO eviction (dicts keep insertion order)
+        _EMB_CACHE[key] = vec
+    return vec
+
+
+# -------------------------
+# Retrieval cache (exact question, then embedding similarity)
+# -------------------------
+RAG_CACHE_SIZE = int(os.getenv("RAG_CACHE_SIZE", "512"))
+RAG_CACHE_THRESHOLD = float(os.getenv("RAG_CACHE_THRESHOLD", "0.86"))
+
+class _QVCache:
+    """
+    Bounded two-tier cache of retrieved contexts. Exact hits are keyed by a hash
+    of the raw question. The semantic tier keeps one centroid per cluster of
+    paraphrased queries (circular buffer, oldest cluster overwritten first): a
+    query within `threshold` cosine of a centroid joins that cluster, moving the
+    centroid to the running mean, and gets the cluster's context. Entries are
+    scoped by `scope` (k + source filter) so results never leak across
+    different retrieval settings.
+    """
+
+    def __init__(self, capacity: int, threshold: float):
+        self.capacity = capacity
+        self.threshold = threshold
+        self.exact: OrderedDict[str, List[Dict[str, str]]] = OrderedDict()
+        self.E: np.ndarray | None = None  # (capacity, d) float32 centroids, allocated on first put
+        self.counts = np.zeros(capacity, dtype=np.int64)  # queries folded into each centroid
+        self.scopes = np.zeros(capacity, dtype=np.int64)
+        self.payloads: List[List[Dict[str, str]] | None] = [None] * capacity
+        self.filled = 0
+        self.next = 0
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def exact_key(question: str, scope: str) -> str:
+        return hashlib.sha256(f"{scope}|{question}".encode("utf-8")).hexdigest()
+
+    def get_exact(self, key: str) -> List[Dict[str, str]] | None:
+        with self.lock:
+            hit = self.exact.get(key)
+            if hit is not None:
+                self.exact.move_to_end(key)
+            return hit
+
+    def get_similar(self, qv: np.ndarray, scope: str, key: str | None = None) -> List[Dict[str, str]] | None:
+        with self.lock:
+            if self.E is None or not self.filled:
+                return None
+            scores = self.E[:self.filled] @ qv
+            scores[self.scopes[:self.filled] != hash(scope)] = -1.0
+            best = int(scores.argmax())
+            if scores[best] < self.threshold:
+                return None
+            # Join the cluster: running-mean update, then re-normalize
+            n = self.counts[best]
+            c = (self.E[best] * n + qv) / (n + 1)
+            norm = np.linalg.norm(c)
+            self.E[best] = c / norm if norm else c
+            self.counts[best] = n + 1
+            payload = self.payloads[best]
+            if key is not None:
+                self._put_exact(key, payload)
+            return payload
+
+    def _put_exact(self, key: str, payload: List[Dict[str, str]]) -> None:
+        self.exact[key] = payload
+        if len(self.exact) > self.capacity:
+            self.exact.popitem(last=False)
+
+    def put(self, key: str, qv: np.ndarray, scope: str, payload: List[Dict[str, str]]) -> None:
+        with self.lock:
+            self._put_exact(key, payload)
+            if self.E is None:
+                self.E = np.zeros((self.capacity, qv.shape[0]), dtype=np.float32)
+            i = self.next
+            self.E[i] = qv
+            self.counts[i] = 1
+            self.scopes[i] = hash(scope)
+            self.payloads[i] = payload
+            self.next = (i + 1) % self.capacity
+            self.filled = min(self.filled + 1, self.capacity)
+
+_RETRIEVE_CACHE = _QVCache(RAG_CACHE_SIZE, RAG_CACHE_THRESHOLD)
+
+def _normalize(vec: list[float]) -> np.ndarray:
+    q = np.asarray(vec, dtype=np.float32)
+    n = np.linalg.norm(q)
+    return q / n if n else q
 
 
 # -------------------------
 # Retrieval from Qdrant (optional)
 # -------------------------
-def retrieve(question: str, k: int = 8, source_contains: str | None = None) -> List[Dict[str, str]]:
+# Resolved once at import; Cloud Run still starts if qdrant-client isn't installed
+try:
+    from qdrant_client.models import Filter, FieldCondition, MatchText
+    from .qdrant_client import client as _QDRANT, COLLECTION
+    _QDRANT_OK = True
+except Exception as e:
+    print("[rag] qdrant unavailable:", type(e).__name__, e)
+    _QDRANT_OK = False
+
+RAG_DEBUG = (os.getenv("RAG_DEBUG") or "").lower() in ("1", "true", "yes")
+_EMPTY: Dict[str, Any] = {}
+
+async def retrieve(question: str, k: int = 8, source_contains: str | None = None) -> List[Dict[str, str]]:
     """
     Try Qdrant (if available). If not installed/configured, return [] and we will
     fall back to question-only generation (handled later).
     """
-    try:
-        # Lazy imports so Cloud Run starts even if qdrant-client isn't installed
-        from qdrant_client.models import Filter, FieldCondition, MatchText
-        from .qdrant_client import client, COLLECTION
+    return await _retrieve(question, k, source_contains) or []
 
-        qv = _embed_single(question)
+async def _retrieve(question: str, k: int = 8, source_contains: str | None = None) -> List[Dict[str, str]] | None:
+    """retrieve(), but None when retrieval did not run (no Qdrant, embed/search error)."""
+    if not _QDRANT_OK:
+        return None
+    try:
+        scope = f"{k}|{source_contains or ''}"
+        exact_key = _QVCache.exact_key(question, scope)
+        cached = _RETRIEVE_CACHE.get_exact(exact_key)
+        if cached is not None:
+            return cached
+
+        qv = await _embed_query(question)
+        qn = _normalize(qv)
+        cached = _RETRIEVE_CACHE.get_similar(qn, scope, exact_key)
+        if cached is not None:
+            return cached
 
         qfilter = None
         if source_contains:
             qfilter = Filter(must=[FieldCondition(key="source", match=MatchText(text=source_contains))])
 
-        hits = client.search(
+        # Embedded Qdrant holds a single-process lock on its storage, so an
+        # AsyncQdrantClient can't open it alongside `_QDRANT`; search off-loop instead
+        res = await asyncio.to_thread(
+            _QDRANT.query_points,
             collection_name=COLLECTION,
-            query_vector=qv,
+            query=qv,
+            query_filter=qfilter,
             limit=k,
-            query_filter=qfilter
         )
-
-        out: List[Dict[str, str]] = []
-        for h in hits:
-            payload = getattr(h, "payload", {}) or {}
-            out.append({
-                "text": payload.get("chunk", ""),
-                "source": payload.get("source", "")
-            })
-        print(f"[rag] Retrieved {len(out)} chunks; sources -> {debug_sources(out)}")
+        hits = res.points
+
+        out: List[Dict[str, str]] = [
+            {"text": (p := getattr(h, "payload", None) or _EMPTY).get("chunk", ""), "source": p.get("source", "")}
+            for h in hits
+        ]
+        if RAG_DEBUG:
+            print(f"[rag] Retrieved {len(out)} chunks; sources -> {debug_sources(out)}")
+        _RETRIEVE_CACHE.put(exact_key, qn, scope, out)
         return out
     except Exception as e:
         print("[rag] retrieve disabled (no qdrant or not configured):", type(e).__name__, e)
-        return []
+        return None
 
 def debug_sources(context: List[Dict[str, str]]) -> List[str]:
     return list({c.get("source", "") for c in context if c.get("source")})
@@ -114,92 +274,237 @@ Context:
 Respond with ONLY JSON (no commentary).
 """
 
+OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
+
+# -------------------------
+# Response cache (exact match, on disk)
+# -------------------------
+RESPONSE_CACHE_TTL = int(os.getenv("RESPONSE_CACHE_TTL", "86400"))  # seconds; 0 disables
+RESPONSE_CACHE_DIR = Path(__file__).resolve().parents[1] / "cache" / "responses"
+# Deterministic output makes cached answers representative of a fresh call
+LLM_TEMPERATURE = 0.0 if RESPONSE_CACHE_TTL > 0 else 0.2
+# Opt-in: start the question-only LLM call alongside retrieval (cancelled if context
+# is found). Lowers latency on empty retrievals but pays for a wasted call otherwise
+RACE_QUESTION_ONLY = (os.getenv("RACE_QUESTION_ONLY") or "").lower() in ("1", "true", "yes")
+
+def _response_cache_path(question: str, source_contains: str | None) -> Path:
+    key = hashlib.blake2b(f"{OPENAI_MODEL}|{source_contains or ''}|{question}".encode("utf-8"), digest_size=16).hexdigest()
+    return RESPONSE_CACHE_DIR / f"{key}.json"
+
+def _response_cache_get(path: Path) -> Dict[str, Any] | None:
+    if RESPONSE_CACHE_TTL <= 0:
+        return None
+    try:
+        if time.time() - path.stat().st_mtime > RESPONSE_CACHE_TTL:
+            path.unlink(missing_ok=True)  # expired: prune so the cache dir doesn't grow forever
+            return None
+        return orjson.loads(path.read_bytes())
+    except (OSError, orjson.JSONDecodeError):
+        return None
+
+def _response_cache_put(path: Path, data: Dict[str, Any]) -> None:
+    if RESPONSE_CACHE_TTL <= 0:
+        return
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Unique temp name: workers answering the same question must not share one
+        fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=path.stem, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(orjson.dumps(data))
+            os.replace(tmp, path)
+        except BaseException:
+            Path(tmp).unlink(missing_ok=True)
+            raise
+    except OSError as e:
+        print("[rag] response cache write failed:", type(e).__name__, e)
+
+def _match_brace(text: str, start: int) -> int:
+    """Index of the "}" closing the object that opens at text[start], or -1."""
+    depth, in_str, esc = 0, False, False
+    for i in range(start, len(text)):
+        ch = text[i]
+        if in_str:
+            if esc:
+                esc = False
+            elif ch == "\\":
+                esc = True
+            elif ch == '"':
+                in_str = False
+        elif ch == '"':
+            in_str = True
+        elif ch == "{":
+            depth += 1
+        elif ch == "}":
+            depth -= 1
+            if depth == 0:
+                return i
+    return -1
+
 def _extract_json(text: str) -> Dict[str, Any]:
     if not text:
         raise ValueError("Empty LLM response")
-    fence = re.search(r"```(?:json)?\s*([\s\S]*?)```", text, re.IGNORECASE)
-    if fence:
-        text = fence.group(1).strip()
-    brace = re.search(r"\{[\s\S]*\}", text)
-    if brace:
-        text = brace.group(0)
-    return json.loads(text)
-
-def _call_llm_for_json(question: str, context: List[Dict[str, str]]) -> Dict[str, Any]:
+    # Fast path: JSON mode returns a bare object
+    stripped = text.strip()
+    if stripped.startswith("{"):
+        try:
+            return orjson.loads(stripped.encode())
+        except orjson.JSONDecodeError:
+            pass
+    # Peel a ``` / ```json fence if present (the language tag is skipped by the brace search)
+    fence = text.find("```")
+    if fence != -1:
+        close = text.find("```", fence + 3)
+        if close != -1:
+            text = text[fence + 3:close]
+    # First balanced {...} object
+    start = text.find("{")
+    if start != -1:
+        end = _match_brace(text, start)
+        text = text[start:end + 1] if end != -1 else text[start:]
+    return orjson.loads(text.encode())
+
+async def _call_llm_for_json(question: str, context: List[Dict[str, str]]) -> Dict[str, Any]:
     api_key = os.getenv("OPENAI_API_KEY", "").strip()
     if not api_key:
         raise RuntimeError("OPENAI_API_KEY not set")
 
-    model = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
+    model = OPENAI_MODEL
     prompt = _build_prompt(question, context)
 
     try:
-        from openai import OpenAI
-        client = OpenAI(api_key=api_key)
-        resp = client.responses.create(
+        resp = await _openai_client().responses.create(
             model=model,
             input=[{"role": "user", "content": prompt}],
-            temperature=0.2,
+            temperature=LLM_TEMPERATURE,
+            text={"format": {"type": "json_object"}},  # JSON mode: output is a bare object
         )
         return _extract_json(resp.output_text)
-    except Exception:
-        # Legacy fallback
-        try:
-            import openai
-            openai.api_key = api_key
-            chat = openai.ChatCompletion.create(
-                model=model,
-                messages=[{"role": "user", "content": prompt}],
-                temperature=0.2,
-            )
-            return _extract_json(chat["choices"][0]["message"]["content"])
-        except Exception as e2:
-            raise RuntimeError(f"LLM call failed: {type(e2).__name__}: {e2}") from e2
+    except Exception as e:
+        raise RuntimeError(f"LLM call failed: {type(e).__name__}: {e}") from e
 
+_STEPS_OPEN = re.compile(r'"steps"\s*:\s*\[')
 
-# -------------------------
-# Public: generate_json
-# -------------------------
-def generate_json(question: str, source_contains: str | None = None) -> Dict[str, Any]:
+class _StepScanner:
     """
-    Returns a dict shaped for the Jinja template. Never raises.
+    Incrementally pulls completed objects out of the "steps" array of a JSON
+    document as it streams in, so each step can be emitted before the whole
+    response has arrived.
     """
-    # Step 1: try to retrieve context (optional)
-    try:
-        context = retrieve(question, k=8, source_contains=source_contains)
-    except Exception as e:
-        print("[rag] retrieve error:", type(e).__name__, e)
-        context = []
 
-    # Step 2: call LLM once (with context if present, else question-only)
+    def __init__(self):
+        self.buf = ""
+        self.pos = -1  # next unscanned index; -1 until the array opens
+        self.depth = 0
+        self.start = 0
+        self.in_str = False
+        self.esc = False
+        self.done = False
+
+    def feed(self, delta: str) -> List[Dict[str, Any]]:
+        self.buf += delta
+        out: List[Dict[str, Any]] = []
+        if self.done:
+            return out
+        if self.pos < 0:
+            m = _STEPS_OPEN.search(self.buf)
+            if not m:
+                return out
+            self.pos = m.end()
+        buf, i = self.buf, self.pos
+        while i < len(buf):
+            ch = buf[i]
+            if self.in_str:
+                if self.esc:
+                    self.esc = False
+                elif ch == "\\":
+                    self.esc = True
+                elif ch == '"':
+                    self.in_str = False
+            elif ch == '"':
+                self.in_str = True
+            elif ch == "{":
+                if self.depth == 0:
+                    self.start = i
+                self.depth += 1
+            elif ch == "}":
+                self.depth -= 1
+                if self.depth == 0:
+                    try:
+                        out.append(orjson.loads(buf[self.start:i + 1]))
+                    except orjson.JSONDecodeError:
+                        pass
+            elif ch == "]" and self.depth == 0:
+                self.done = True
+                break
+            i += 1
+        self.pos = i
+        return out
+
+async def _stream_llm_json(question: str, context: List[Dict[str, str]]) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+    """
+    Streaming variant of _call_llm_for_json: yields ("step", step) for each step
+    as soon as it is complete, then ("done", data) with the fully parsed object.
+    """
+    api_key = os.getenv("OPENAI_API_KEY", "").strip()
+    if not api_key:
+        raise RuntimeError("OPENAI_API_KEY not set")
+
+    prompt = _build_prompt(question, context)
+    scanner = _StepScanner()
     try:
-        data = _call_llm_for_json(question, context if context else [])
+        stream = await _openai_client().responses.create(
+            model=OPENAI_MODEL,
+            input=[{"role": "user", "content": prompt}],
+            temperature=LLM_TEMPERATURE,
+            text={"format": {"type": "json_object"}},
+            stream=True,
+        )
+        async for event in stream:
+            if event.type == "response.output_text.delta":
+                for step in scanner.feed(event.delta):
+                    yield "step", step
     except Exception as e:
-        print("[rag] LLM path failed:", type(e).__name__, e)
-        # Minimal scaffold so page still renders
-        pretty = question
-        for p in ("How do I", "How to"):
-            if pretty.startswith(p):
-                pretty = pretty[len(p):].strip()
-        title = f"How to {pretty.capitalize()}" if pretty else "How-To Guide"
-        data = {
-            "title": title,
-            "description": "This guide was generated without full context (fallback mode).",
-            "steps": [{
-                "number": 1,
-                "title": "Start with the basics",
-                "action": "Break the task into small, verifiable steps.",
-                "why": "Smaller steps reduce errors and make progress visible.",
-                "check": "You can confirm each step independently.",
-                "illustration_caption": "Show the first action on screen."
-            }],
-            "pro_tip": "Add more details as you iterate.",
-            "troubleshooting": [],
-            "safety": [],
-            "abstain": False,
-        }
-
-    # Step 3: ensure required keys exist (defensive)
+        raise RuntimeError(f"LLM call failed: {type(e).__name__}: {e}") from e
+    yield "done", _extract_json(scanner.buf)
+
+
+# Static part of the fallback guide; only the title depends on the question
+_FALLBACK_TEMPLATE: Dict[str, Any] = {
+    "title": "",
+    "description": "This guide was generated without full context (fallback mode).",
+    "steps": [{
+        "number": 1,
+        "title": "Start with the basics",
+        "action": "Break the task into small, verifiable steps.",
+        "why": "Smaller steps reduce errors and make progress visible.",
+        "check": "You can confirm each step independently.",
+        "illustration_caption": "Show the first action on screen."
+    }],
+    "pro_tip": "Add more details as you iterate.",
+    "troubleshooting": [],
+    "safety": [],
+    "abstain": False,
+}
+_TITLE_PREFIX = re.compile(r"^(?:How do I|How to)\s*")
+
+def _make_title(question: str) -> str:
+    pretty = _TITLE_PREFIX.sub("", question, count=1).strip()
+    return f"How to {pretty[:1].upper()}{pretty[1:]}" if pretty else "How-To Guide"
+
+def _fallback_data(question: str) -> Dict[str, Any]:
+    # Minimal scaffold so page still renders. Steps are copied because
+    # attach_step_images writes image fields into each step dict.
+    return {
+        **_FALLBACK_TEMPLATE,
+        "title": _make_title(question),
+        "steps": [dict(s) for s in _FALLBACK_TEMPLATE["steps"]],
+        "troubleshooting": [],
+        "safety": [],
+    }
+
+def _with_defaults(data: Dict[str, Any]) -> Dict[str, Any]:
+    # Ensure required keys exist (defensive)
     data.setdefault("title", "")
     data.setdefault("description", "")
     data.setdefault("steps", [])
@@ -209,14 +514,101 @@ def generate_json(question: str, source_contains: str | None = None) -> Dict[str
     return data
 
 
+# -------------------------
+# Public: generate_json
+# -------------------------
+async def generate_json(question: str, source_contains: str | None = None) -> Dict[str, Any]:
+    """
+    Returns a dict shaped for the Jinja template. Never raises.
+    """
+    # Step 0: identical question already answered?
+    cache_path = _response_cache_path(question, source_contains)
+    cached = _response_cache_get(cache_path)
+    if cached is not None:
+        return _with_defaults(cached)
+
+    # Step 1: retrieve context while (optionally) speculating on the question-only
+    # answer, so an empty retrieval costs max(retrieve, llm) rather than the sum
+    q_only = None
+    if RACE_QUESTION_ONLY:
+        q_only = asyncio.create_task(_call_llm_for_json(question, []))
+        q_only.add_done_callback(lambda t: t.cancelled() or t.exception())  # never "unretrieved"
+    try:
+        try:
+            context = await _retrieve(question, k=8, source_contains=source_contains)
+        except Exception as e:
+            print("[rag] retrieve error:", type(e).__name__, e)
+            context = None
+        # Only cache answers from a retrieval that actually ran; a transient
+        # embed/Qdrant failure must not pin a question-only answer for the TTL
+        cacheable = context is not None
+
+        # Step 2: call LLM once (with context if present, else question-only)
+        try:
+            if context:
+                if q_only is not None:
+                    q_only.cancel()
+                data = await _call_llm_for_json(question, context)
+            elif q_only is not None:
+                data = await q_only
+            else:
+                data = await _call_llm_for_json(question, [])
+            if cacheable:
+                _response_cache_put(cache_path, data)
+        except Exception as e:
+            print("[rag] LLM path failed:", type(e).__name__, e)
+            data = _fallback_data(question)
+    finally:
+        # Client disconnects cancel us mid-await; don't leave the speculative call billing
+        if q_only is not None:
+            q_only.cancel()
+
+    return _with_defaults(data)
+
+
+async def stream_json(question: str, source_contains: str | None = None) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+    """
+    Streaming counterpart of generate_json. Yields ("step", step) events while
+    the LLM is still writing, then one ("done", data) with the final dict (which
+    is authoritative: steps may differ if the stream failed part-way). Never raises.
+    """
+    cache_path = _response_cache_path(question, source_contains)
+    cached = _response_cache_get(cache_path)
+    if cached is not None:
+        yield "done", _with_defaults(cached)
+        return
+
+    try:
+        context = await _retrieve(question, k=8, source_contains=source_contains)
+    except Exception as e:
+        print("[rag] retrieve error:", type(e).__name__, e)
+        context = None
+    cacheable = context is not None  # see generate_json
+
+    data = None
+    try:
+        async for kind, payload in _stream_llm_json(question, context or []):
+            if kind == "step":
+                yield kind, payload
+            else:
+                data = payload
+        if cacheable:
+            _response_cache_put(cache_path, data)
+    except Exception as e:
+        print("[rag] LLM stream failed:", type(e).__name__, e)
+        data = _fallback_data(question)
+
+    yield "done", _with_defaults(data)
+
+
 # -------------------------
 # Image helpers
 # -------------------------
 from .image_gen import attach_step_images
 
-def maybe_attach_images(data: dict) -> dict:
+async def maybe_attach_images(data: dict) -> dict:
     try:
-        return attach_step_images(data)
+        return await attach_step_images(data)
     except Exception as e:
         print("[maybe_attach_images] ERROR:", type(e).__name__, e)
         return data
@@ -1,42 +1,115 @@
 # server/routes.py
 from pathlib import Path
 from io import BytesIO
+from urllib.parse import urlencode, quote
+from html import unescape
 import re
+import unicodedata
 
-from fastapi import APIRouter, Request, HTTPException
+import orjson
+from pypdf import PdfReader, PdfWriter
+
+from fastapi import APIRouter, Request, HTTPException, Response
 from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.templating import Jinja2Templates
 
-from .rag import maybe_attach_images, generate_json
+from .rag import maybe_attach_images, generate_json, stream_json
+from .pdf import render_pdf, PdfUnavailable
 
 router = APIRouter()
 
 BASE_DIR = Path(__file__).resolve().parents[1]
 templates = Jinja2Templates(directory=str(BASE_DIR / "templates"))
 
-def _build_data(payload: dict | None):
+_TITLE_RE = re.compile(r"<title>(.*?)</title>", re.IGNORECASE | re.DOTALL)
+
+async def _build_data(payload: dict | None):
     if payload and isinstance(payload, dict) and payload.get("steps"):
         return payload
     q = (payload or {}).get("question")
     src = (payload or {}).get("source")
-    return generate_json(q or "placeholder", source_contains=src)
+    return await generate_json(q or "placeholder", source_contains=src)
+
+def _include_images(payload: dict | None, default: bool) -> bool:
+    # Image generation is the slowest step; JSON callers opt in, HTML opts out
+    return bool((payload or {}).get("include_images", default))
 
 @router.get("/health")
 def health():
     return {"ok": True}
 
 @router.post("/howto/json")
-def howto_json(payload: dict | None = None):
-    data = _build_data(payload)
-    data = maybe_attach_images(data)
-    return JSONResponse(data)
+async def howto_json(payload: dict | None = None):
+    data = await _build_data(payload)
+    if _include_images(payload, default=False):
+        data = await maybe_attach_images(data)
+    # orjson directly: JSONResponse encodes with stdlib json.dumps
+    return Response(orjson.dumps(data), media_type="application/json")
+
+@router.get("/howto/stream")
+async def howto_stream(question: str, source: str | None = None, include_images: bool = True):
+    """
+    Server-sent events: one `step` event per step as the LLM writes it, then a
+    `done` event carrying the final data (with image URLs attached).
+    """
+    async def events():
+        async for kind, data in stream_json(question, source_contains=source):
+            if kind == "done" and include_images:
+                data = await maybe_attach_images(data)
+            yield f"event: {kind}\ndata: {orjson.dumps(data).decode()}\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
 
 @router.post("/howto/html")
-def howto_html(request: Request, payload: dict | None = None):
-    data = _build_data(payload)
-    data = maybe_attach_images(data)
-    return templates.TemplateResponse("guide.html", {"request": request, **data})
+async def howto_html(request: Request, payload: dict | None = None):
+    if payload and payload.get("stream") and not payload.get("steps"):
+        # Skeleton page that hydrates itself from /howto/stream
+        q = payload.get("question") or "placeholder"
+        params = {"question": q}
+        if payload.get("source"):
+            params["source"] = payload["source"]
+        if not _include_images(payload, default=True):
+            params["include_images"] = "false"
+        return templates.TemplateResponse(request, "guide.html", {
+            "title": q,
+            "steps": [],
+            "stream_url": "/howto/stream?" + urlencode(params),
+        })
+    data = await _build_data(payload)
+    if _include_images(payload, default=True):
+        data = await maybe_attach_images(data)
+    return templates.TemplateResponse(request, "guide.html", data)
 
 @router.post("/html-to-pdf")
-async def html_to_pdf_stub(payload: dict):
-    return JSONResponse({"error": "PDF temporarily disabled for deploy sanity check"}, status_code=503)
\ No newline at end of file
+async def html_to_pdf(payload: dict):
+    html = (payload or {}).get("html") or ""
+    if not html.strip():
+        raise HTTPException(status_code=400, detail="Missing 'html'")
+    try:
+        pdf_bytes = await render_pdf(html)
+    except PdfUnavailable as e:
+        return JSONResponse({"error": str(e)}, status_code=503)
+
+    m = _TITLE_RE.search(html)
+    title = unescape(m.group(1)).strip() if m else "Guide"
+
+    # Stamp the document title into the PDF metadata; a full pypdf
+    # read/write pass is only worth it when there is a real title to set
+    if m and title and title != "Guide":
+        writer = PdfWriter(clone_from=PdfReader(BytesIO(pdf_bytes)))
+        writer.add_metadata({"/Title": title})
+        buf = BytesIO()
+        writer.write(buf)
+        buf.seek(0)
+    else:
+        buf = BytesIO(pdf_bytes)
+
+    # Headers are latin-1: send an ASCII filename plus the RFC 5987 UTF-8 form
+    filename = re.sub(r"[^\w\- ]+", "", title).strip() or "guide"
+    ascii_name = unicodedata.normalize("NFKD", filename).encode("ascii", "ignore").decode().strip() or "guide"
+    disposition = f'attachment; filename="{ascii_name}.pdf"; filename*=UTF-8\'\'{quote(filename + ".pdf")}'
+    return StreamingResponse(
+        buf,
+        media_type="application/pdf",
+        headers={"Content-Disposition": disposition},
+    )
@@ -31,4 +31,4 @@ pip list | grep -E "(fastapi|uvicorn|jinja2)" || true
 
 # Start FastAPI (use Cloud Run's PORT)
 echo "=== Starting Server on PORT ${PORT:-8080} ==="
-exec python -m uvicorn server.app:app --host 0.0.0.0 --port ${PORT:-8080} --log-level debug
\ No newline at end of file
+exec python -m uvicorn server.app:app --host 0.0.0.0 --port ${PORT:-8080} --loop uvloop --http httptools --log-level debug
\ No newline at end of file